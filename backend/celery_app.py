@@ -0,0 +1,15 @@
+import os
+
+from celery import Celery
+
+BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+
+celery = Celery("autocut", broker=BROKER_URL, include=["tasks"])
+
+# One task per worker process at a time: Whisper inference is long-running and
+# GPU-bound, so prefetching more would only queue work behind a busy GPU.
+celery.conf.worker_prefetch_multiplier = 1
+
+# Children load Whisper (and download weights on first start) in worker_process_init before
+# reporting UP; Celery's 4s default would SIGKILL them mid-load and respawn forever.
+celery.conf.worker_proc_alive_timeout = float(os.getenv("CELERY_PROC_ALIVE_TIMEOUT", "300"))
@@ -1,26 +1,28 @@
+import asyncio
 import os
 import uuid
 import shutil
 from pathlib import Path
 from typing import Dict, Any
-import modules.diarization
-import aiofiles
-import whisper
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from kombu.exceptions import OperationalError
 from pydantic import BaseModel
 
+from tasks import transcribe_task
+
 BASE_DIR = Path(__file__).resolve().parent
 INPUT_DIR = BASE_DIR / "../assets/inputs"
 OUTPUT_DIR = BASE_DIR / "../assets/outputs"
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# Fail fast when the broker is unreachable instead of retrying the publish for long
+ENQUEUE_RETRY_POLICY = {"max_retries": 2, "interval_start": 0, "interval_step": 0.5, "interval_max": 1}
 
 INPUT_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 app = FastAPI(title="AutoCut - Whisper Transcription API", version="0.1")
 
-MODEL = None
-
 
 class TranscriptionResult(BaseModel):
     task_id: str
@@ -30,101 +32,63 @@ class TranscriptionResult(BaseModel):
     srt_path: str
     json_path: str
 
-@app.on_event("startup")
-def load_model():
-    """
-    Loads the Whisper model into a global variable once at startup.
-    Change model_name to "small", "base", "medium", "large" depending on resources.
-    """
-    global MODEL
-    model_name = os.getenv("WHISPER_MODEL", "small")  # change to "base" or "medium" as needed
-    print(f"Loading Whisper model: {model_name} ... (this may take a while)")
-    MODEL = whisper.load_model(model_name)
-    print("Model loaded.")
-
-def _format_srt(segments: list) -> str:
-    """
-    Convert Whisper segments into SRT formatted string.
-    segments: list of dicts with keys 'start', 'end', 'text'
-    """
-    def _sec_to_srt_timestamp(s: float) -> str:
-        h = int(s // 3600)
-        m = int((s % 3600) // 60)
-        sec = int(s % 60)
-        ms = int((s - int(s)) * 1000)
-        return f"{h:02}:{m:02}:{sec:02},{ms:03}"
-
-    lines = []
-    for i, seg in enumerate(segments, start=1):
-        start = _sec_to_srt_timestamp(seg["start"])
-        end = _sec_to_srt_timestamp(seg["end"])
-        text = seg["text"].strip()
-        lines.append(f"{i}\n{start} --> {end}\n{text}\n")
-    return "\n".join(lines)
-
-
-def _write_json(path: Path, data: Dict[str, Any]) -> None:
-    import json
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-async def _save_upload_file(upload_file: UploadFile, destination: Path) -> None:
+async def _save_upload_file(upload_file: UploadFile, destination: Path, pcm_destination: Path) -> bool:
     """
-    Save an UploadFile to destination (async).
+    Save an UploadFile to destination (async) while streaming the same chunks through ffmpeg
+    into 16 kHz mono s16le PCM at pcm_destination, so decoding overlaps the upload and the
+    worker never has to re-read and re-decode the media.
+    Returns False if ffmpeg could not decode the stream (e.g. MP4 with a trailing moov atom);
+    the original file is always kept, the editing pipeline needs it anyway.
     """
-    async with aiofiles.open(destination, "wb") as out_file:
-        while content := await upload_file.read(1024 * 1024):
-            await out_file.write(content)
-    await upload_file.close()
-
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", "16000", "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
 
-def transcribe_file_sync(file_path: str, output_dir: Path):
-    """
-    Run whisper transcription (synchronous) and write outputs.
-    """
-    # model is global
-    global MODEL
-    if MODEL is None:
-        raise RuntimeError("Whisper model is not loaded.")
-
-    # use model.transcribe to get segments
-    # set word_timestamps True if using a Whisper fork that supports it.
-    result = MODEL.transcribe(file_path, fp16=False)  # set fp16=True if supported & GPU available
-
-    # ensure output dir exists
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # prepare JSON out
-    json_path = output_dir / "transcript.json"
-    _write_json(json_path, result)
-
-    # segments list is under result["segments"]
-    segments = result.get("segments", [])
-    segments_simple = [
-        {"start": float(s["start"]), "end": float(s["end"]), "text": s["text"].strip()}
-        for s in segments
-    ]
-
-    srt_content = _format_srt(segments_simple)
-    srt_path = output_dir / "transcript.srt"
-    with open(srt_path, "w", encoding="utf-8") as f:
-        f.write(srt_content)
-
-    return {
-        "model": result.get("model", None),
-        "language": result.get("language", None),
-        "segments": segments_simple,
-        "srt_path": str(srt_path),
-        "json_path": str(json_path),
-    }
+    # plain file writes dispatched to a thread beat aiofiles for a single stream
+    async def _pump_pcm():
+        with open(pcm_destination, "wb") as pcm_file:
+            while pcm := await proc.stdout.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(pcm_file.write, pcm)
+
+    pump = asyncio.create_task(_pump_pcm())
+    decoding = True
+    try:
+        with open(destination, "wb") as out_file:
+            while content := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(out_file.write, content)
+                if decoding:
+                    try:
+                        proc.stdin.write(content)
+                        await proc.stdin.drain()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # ffmpeg gave up on the stream; keep saving the upload regardless
+                        decoding = False
+        proc.stdin.close()
+        await pump
+        decoding = await proc.wait() == 0 and decoding
+    finally:
+        # on a client disconnect or read error, don't leave ffmpeg or the pump behind
+        await upload_file.close()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+
+    if not decoding:
+        # the worker decodes the saved upload itself, so a partial PCM is just garbage
+        pcm_destination.unlink(missing_ok=True)
+    return decoding
 
 
 @app.post("/transcribe", response_model=TranscriptionResult)
-async def transcribe(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def transcribe(file: UploadFile = File(...)):
     """
     Upload an audio/video file and transcribe it using Whisper.
-    This endpoint saves the file and performs synchronous transcription in a background thread.
+    This endpoint saves the file and queues transcription on a Celery worker.
     """
     # Basic file validation
     if file.content_type.split("/")[0] not in {"audio", "video"}:
@@ -133,27 +97,35 @@ async def transcribe(background_tasks: BackgroundTasks, file: UploadFile = File(
     task_id = uuid.uuid4().hex
     task_input_dir = (INPUT_DIR / task_id)
     task_output_dir = (OUTPUT_DIR / task_id)
-    task_input_dir.mkdir(parents=True, exist_ok=True)
-    task_output_dir.mkdir(parents=True, exist_ok=True)
-
-    saved_path = task_input_dir / file.filename
-    await _save_upload_file(file, saved_path)
-
-    # Run transcription synchronously but launched via background task (so HTTP returns once transcription finishes).
-    # NOTE: FastAPI BackgroundTasks run in same process synchronously, so for heavy CPU-bound jobs consider Celery/RQ.
-    def _run_and_save():
-        try:
-            out = transcribe_file_sync(str(saved_path), task_output_dir)
-            # augment with task id
-            out["task_id"] = task_id
-            # store final JSON summary
-            _write_json(task_output_dir / "summary.json", out)
-        except Exception as e:
-            # write error file for debugging
-            _write_json(task_output_dir / "error.json", {"error": str(e)})
-
-    # Add to background so response is returned while background runs (note: still same process).
-    background_tasks.add_task(_run_and_save)
+    # INPUT_DIR/OUTPUT_DIR exist since import; only the per-task leaf is new
+    os.mkdir(task_input_dir)
+    os.mkdir(task_output_dir)
+
+    # keep only the basename of the client-supplied name; the PCM lives in the output dir
+    # so no upload name can collide with it
+    upload_name = Path(file.filename or "").name
+    saved_path = task_input_dir / (upload_name if upload_name not in {"", ".", ".."} else "upload")
+    pcm_path = task_output_dir / "audio_16k.pcm"
+    try:
+        pcm_ok = await _save_upload_file(file, saved_path, pcm_path)
+    except BaseException:
+        shutil.rmtree(task_input_dir, ignore_errors=True)
+        shutil.rmtree(task_output_dir, ignore_errors=True)
+        raise
+
+    # Whisper inference is CPU/GPU-bound, so it runs on dedicated Celery workers
+    # instead of inside the uvicorn process.
+    # The publish is blocking kombu I/O, so keep it off the event loop.
+    try:
+        await asyncio.to_thread(
+            transcribe_task.apply_async,
+            args=(str(saved_path), str(task_output_dir), task_id, str(pcm_path) if pcm_ok else None),
+            retry_policy=ENQUEUE_RETRY_POLICY,
+        )
+    except OperationalError:
+        shutil.rmtree(task_input_dir, ignore_errors=True)
+        shutil.rmtree(task_output_dir, ignore_errors=True)
+        raise HTTPException(status_code=503, detail="Transcription queue unavailable, try again later")
 
     # Return immediate response that transcription has started (task id)
     return JSONResponse(
@@ -178,10 +150,8 @@ def get_transcript(task_id: str):
     summary_path = out_dir / "summary.json"
     if not summary_path.exists():
         raise HTTPException(status_code=404, detail="Transcription not ready or task id not found")
-    import json
-    with open(summary_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+    # summary.json is already serialized; stream it as-is instead of parsing and re-encoding
+    return FileResponse(summary_path, media_type="application/json")
 
 if __name__ == "__main__":
     media_path = input("Enter path to your audio/video file: ").strip()
@@ -191,4 +161,5 @@ if __name__ == "__main__":
         raise SystemExit
 
     print(f"[*] Selected: {media_path}")
+    import modules.diarization
     transcript = modules.diarization.transcribe_media(media_path)
\ No newline at end of file
@@ -1,40 +1,94 @@
 # backend/modules/asr_whisperx.py
+import gc
 import os
-import torch
-import whisperx
+import threading
+import orjson
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+# wav2vec2 alignment models are large; keep one per (language, device) for the process lifetime
+_ALIGN_CACHE: Dict[tuple, tuple] = {}
+_ALIGN_LOCK = threading.Lock()
+
+
+def _get_align_model(language: str, device: str) -> tuple:
+    """
+    Return the cached (model, metadata) alignment pair, loading it on first use.
+    """
+    import whisperx
+
+    key = (language, device)
+    with _ALIGN_LOCK:
+        if key not in _ALIGN_CACHE:
+            _ALIGN_CACHE[key] = whisperx.load_align_model(language_code=language, device=device)
+        return _ALIGN_CACHE[key]
+
+
+def _default_batch_size(device: str) -> int:
+    """
+    Pick the largest batch that comfortably fits the GPU's memory.
+    """
+    if not device.startswith("cuda"):
+        return 16
+    import torch
+
+    total_gb = torch.cuda.get_device_properties(torch.device(device)).total_memory / 1024**3
+    if total_gb >= 16:
+        return 32
+    if total_gb >= 10:
+        return 24
+    return 16
+
 
 def transcribe_with_whisperx(
     input_path: str,
     output_dir: Path,
     device: Optional[str] = None,
-    batch_size: int = 16,
-    compute_type: str = "float16",
+    batch_size: Optional[int] = None,
+    compute_type: str = "int8_float16",
     diarize: bool = False,
     hf_token: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Perform transcription using WhisperX with optional diarization.
     """
+    import torch
+    import whisperx
 
     device = device or ("cuda" if torch.cuda.is_available() else "cpu")
     model_name = os.getenv("WHISPER_MODEL", "small")
+    batch_size = batch_size or _default_batch_size(device)
+    if not device.startswith("cuda") and compute_type == "int8_float16":
+        compute_type = "int8"  # CTranslate2 has no float16 kernels on CPU
 
-    print(f"[WhisperX] Loading model {model_name} on {device}...")
-    model = whisperx.load_model(model_name, device=device, compute_type=compute_type)
+    print(f"[WhisperX] Loading model {model_name} on {device} ({compute_type}, batch {batch_size})...")
+    # Greedy decoding without timestamp tokens: the aligner supplies word timings afterwards
+    model = whisperx.load_model(
+        model_name,
+        device=device,
+        compute_type=compute_type,
+        asr_options={"beam_size": 1, "without_timestamps": True},
+    )
+
+    # Decode once; transcription, alignment and diarization all reuse the same PCM
+    audio = whisperx.load_audio(input_path)
 
     # Step 1 — Transcription
     print("[WhisperX] Transcribing...")
-    result = model.transcribe(input_path, batch_size=batch_size)
+    result = model.transcribe(audio, batch_size=batch_size)
     language = result.get("language", "unknown")
 
+    # Free the ASR model before loading the aligner to cap peak VRAM
+    del model
+    gc.collect()
+    if device.startswith("cuda"):
+        torch.cuda.empty_cache()
+
     # Step 2 — Alignment (for word-level timestamps)
     print("[WhisperX] Aligning timestamps...")
-    model_a, metadata = whisperx.load_align_model(language_code=language, device=device)
+    model_a, metadata = _get_align_model(language, device)
     result_aligned = whisperx.align(
-        result["segments"], model_a, metadata, input_path, device, return_char_alignments=False
+        result["segments"], model_a, metadata, audio, device, return_char_alignments=False
     )
 
     # Step 3 — Diarization (optional)
@@ -43,15 +97,16 @@ def transcribe_with_whisperx(
             raise ValueError("Diarization requires a HuggingFace token (pyannote).")
         print("[WhisperX] Performing diarization...")
         diarize_model = whisperx.DiarizationPipeline(use_auth_token=hf_token, device=device)
-        diarize_segments = diarize_model(input_path)
+        diarize_segments = diarize_model(audio)
         result_aligned = whisperx.assign_word_speakers(diarize_segments, result_aligned)
 
     # Save results
     output_dir.mkdir(parents=True, exist_ok=True)
-    import json
     out_json = output_dir / "transcript_whisperx.json"
-    with open(out_json, "w", encoding="utf-8") as f:
-        json.dump(result_aligned, f, ensure_ascii=False, indent=2)
+    # aligned word scores may be numpy scalars, which orjson only accepts with OPT_SERIALIZE_NUMPY
+    out_json.write_bytes(
+        orjson.dumps(result_aligned, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    )
 
     print("[WhisperX] Transcription complete.")
     return result_aligned
@@ -3,11 +3,16 @@
 Manim-AI: Generate caption-based animations from video transcripts.
 This module reads a transcript (JSON) and creates synchronized kinetic-text animations
 using the Manim library.
+
+Rendering uses Manim's Cairo renderer by default. Set MANIM_RENDERER=opengl to
+composite on the GPU instead; that needs `pyopengl` and a GL context that
+moderngl can create (a display, EGL, or xvfb on headless hosts).
 """
 
 import json
+import os
 from pathlib import Path
-from manim import *
+from manim import BLUE_B, BOLD, DOWN, UP, WHITE, YELLOW, FadeIn, FadeOut, Scene, Text, config
 
 # Directory setup
 BASE_DIR = Path(__file__).resolve().parent
@@ -15,6 +20,9 @@ ASSETS_DIR = BASE_DIR / "../../assets"
 ANIMATIONS_DIR = ASSETS_DIR / "animations"
 ANIMATIONS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Segments shorter than this are filler/silence and not worth a render
+MIN_CAPTION_DURATION = 0.2
+
 
 class CaptionScene(Scene):
     """
@@ -29,19 +37,26 @@ class CaptionScene(Scene):
         """
         Create a kinetic-typography-like text animation synchronized to caption timestamps.
         """
+        # Pango text shaping dominates render time; build each distinct caption string once
+        # and hand out copies for repeats (fillers like "Yeah." or "Okay." recur a lot).
+        rendered: dict[str, Text] = {}
+
         for idx, caption in enumerate(self.captions):
             text = caption["text"]
-            duration = max(1.5, caption["end"] - caption["start"])  # minimum 1.5 sec per caption
+            duration = caption["end"] - caption["start"]
+            if duration >= 0.5:
+                duration = max(1.5, duration)  # minimum 1.5 sec per caption, sub-second flashes stay short
 
             # Create text element
-            caption_text = Text(
-                text,
-                font="Inter",
-                color=WHITE,
-                weight=BOLD,
-                t2c={"AI": YELLOW, "Co-Editor": BLUE_B},
-            ).scale(0.7)
-            caption_text.move_to(DOWN * 2)
+            if text not in rendered:
+                rendered[text] = Text(
+                    text,
+                    font="Inter",
+                    color=WHITE,
+                    weight=BOLD,
+                    t2c={"AI": YELLOW, "Co-Editor": BLUE_B},
+                ).scale(0.7).move_to(DOWN * 2)
+            caption_text = rendered[text].copy()
 
             # Animate: fade in, wait, fade out
             self.play(FadeIn(caption_text, shift=UP), run_time=0.5)
@@ -62,16 +77,26 @@ def generate_caption_animation(transcript_path: str, output_name: str = "caption
 
     # Extract captions (handle both Whisper and WhisperX formats)
     segments = data.get("segments", [])
-    captions = [{"text": seg["text"], "start": seg["start"], "end": seg["end"]} for seg in segments]
+    # Skip blank and near-zero-length segments
+    captions = [
+        {"text": text, "start": seg["start"], "end": seg["end"]}
+        for seg in segments
+        if (text := seg["text"].strip()) and seg["end"] - seg["start"] >= MIN_CAPTION_DURATION
+    ]
 
     # Output directory
     output_path = ANIMATIONS_DIR / output_name
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Render scene
+    config.renderer = os.getenv("MANIM_RENDERER", "cairo")
+    config.preview = False
+    config.write_to_movie = True
+    config.disable_caching = False  # Cairo only: reuse cached partial movies (OpenGL has no cache)
     config.video_dir = str(ANIMATIONS_DIR)
-    config.media_width = "1920"
-    config.media_height = "1080"
+    config.pixel_width = 1920
+    config.pixel_height = 1080
+    config.frame_rate = 30
     config.background_color = "#000000"
     config.output_file = str(output_path)
 
@@ -0,0 +1,114 @@
+# backend/modules/vad.py
+"""
+Voice activity detection with the Silero-VAD model bundled in faster-whisper (ONNX weights
+ship with the package, so nothing is fetched at runtime).
+Splits media into speech-only chunks of bounded length so Whisper never spends
+encoder passes on silence and each decode works on at most ~30 seconds of audio.
+"""
+
+import subprocess
+from typing import Any, Iterator
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def load_audio(path: str, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode any audio/video file to mono float32 PCM at `sr` Hz using ffmpeg.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "-",
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def load_pcm(path: str) -> np.ndarray:
+    """
+    Read raw mono s16le PCM (already at SAMPLE_RATE) into float32 samples.
+    """
+    return np.fromfile(path, np.int16).astype(np.float32) / 32768.0
+
+
+def load_vad() -> None:
+    """
+    Load the Silero-VAD model once per process (faster-whisper caches it); call at worker init
+    so the first task does not pay for it.
+    """
+    from faster_whisper.vad import get_vad_model
+
+    get_vad_model()
+
+
+def speech_timestamps(audio: np.ndarray, sr: int = SAMPLE_RATE) -> Iterator[tuple[float, float]]:
+    """
+    Yield (start, end) times in seconds for each speech region in `audio`.
+    """
+    from faster_whisper.vad import get_speech_timestamps
+
+    for ts in get_speech_timestamps(audio, sampling_rate=sr):
+        yield ts["start"] / sr, ts["end"] / sr
+
+
+def merge_chunks(
+    timestamps: Iterator[tuple[float, float]],
+    max_duration: float = 30.0,
+    overlap: float = 1.0,
+) -> list[tuple[float, float]]:
+    """
+    Greedily merge speech regions into windows of at most `max_duration` seconds.
+    Regions longer than a window are split with `overlap` seconds shared between neighbours.
+    """
+    chunks = []
+    current = None
+    for start, end in timestamps:
+        # split over-long regions into overlapping windows first
+        pieces = []
+        while end - start > max_duration:
+            pieces.append((start, start + max_duration))
+            start += max_duration - overlap
+        pieces.append((start, end))
+
+        for piece_start, piece_end in pieces:
+            if current is not None and piece_end - current[0] <= max_duration:
+                current = (current[0], piece_end)
+                continue
+            if current is not None:
+                chunks.append(current)
+            current = (piece_start, piece_end)
+
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+def trim_overlap(segments, offset: float, last_end: float) -> list[tuple[float, float, str, Any]]:
+    """
+    Shift one chunk's Whisper segments by the chunk `offset` and drop only the speech already
+    emitted up to `last_end` (the overlap with the previous chunk).
+    A segment straddling `last_end` keeps the words that start at or after it; without word
+    timestamps its start is clipped to `last_end` and the text is kept whole.
+    Returns (start, end, text, segment) tuples.
+    """
+    kept = []
+    for seg in segments:
+        start, end, text = seg.start + offset, seg.end + offset, seg.text
+        if end <= last_end:
+            continue
+        if start < last_end:
+            if seg.words:
+                words = [w for w in seg.words if w.start + offset >= last_end]
+                if not words:
+                    continue
+                start = words[0].start + offset
+                text = "".join(w.word for w in words)
+            else:
+                start = last_end
+        kept.append((start, end, text, seg))
+    return kept
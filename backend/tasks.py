@@ -0,0 +1,286 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any
+
+import numpy as np
+import orjson
+from billiard import current_process
+from celery.signals import worker_process_init
+
+from celery_app import celery
+from modules.vad import (
+    SAMPLE_RATE,
+    load_audio,
+    load_pcm,
+    load_vad,
+    merge_chunks,
+    speech_timestamps,
+    trim_overlap,
+)
+
+MODELS: list = []
+
+# Set AUTOCUT_KEEP_RAW=1 to keep tokens/log-probs in transcript.json for debugging
+KEEP_RAW = os.getenv("AUTOCUT_KEEP_RAW") == "1"
+
+# Identical segments in a row beyond this count are treated as a hallucination loop
+MAX_SEGMENT_REPEATS = 4
+
+# Flush the streamed SRT every N cues so readers see progress before the task ends
+SRT_FLUSH_EVERY = 20
+
+
+@worker_process_init.connect
+def load_model(**kwargs):
+    """
+    Loads one Whisper model per visible GPU (or a single CPU model) once per worker process.
+    Change model_name to "small", "base", "medium", "large" depending on resources.
+    When CUDA_VISIBLE_DEVICES lists several GPUs, each prefork child is pinned to one of them
+    (`make worker`). Without it every child sees every GPU, so only run a single child in
+    that mode (`make worker-fanout`), otherwise each GPU holds one model copy per child.
+    """
+    global MODELS
+    visible = os.getenv("CUDA_VISIBLE_DEVICES")
+    if visible:
+        gpus = [g for g in visible.split(",") if g.strip()]
+        if gpus:
+            os.environ["CUDA_VISIBLE_DEVICES"] = gpus[(current_process().index or 0) % len(gpus)]
+
+    # heavy imports stay out of the API process, which only enqueues tasks
+    import torch
+    from faster_whisper import WhisperModel
+
+    model_name = os.getenv("WHISPER_MODEL", "small")  # change to "base" or "medium" as needed
+    print(f"Loading Whisper model: {model_name} ... (this may take a while)")
+    if torch.cuda.is_available():
+        MODELS = [
+            WhisperModel(model_name, device="cuda", device_index=i, compute_type="int8_float16")
+            for i in range(torch.cuda.device_count())
+        ]
+    else:
+        MODELS = [WhisperModel(model_name, device="cpu", compute_type="int8")]
+    load_vad()
+    print("Model loaded.")
+
+
+def _srt_timestamp(ms: int) -> str:
+    """
+    Format integer milliseconds as an SRT timestamp (HH:MM:SS,mmm).
+    """
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def _srt_entry(index: int, seg: Dict[str, Any]) -> str:
+    """
+    Format one segment (dict with keys 'start', 'end', 'text') as an SRT cue.
+    """
+    return (
+        f"{index}\n{_srt_timestamp(int(seg['start'] * 1000))} --> "
+        f"{_srt_timestamp(int(seg['end'] * 1000))}\n{seg['text'].strip()}\n\n"
+    )
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    # write-then-rename so the API never serves a half-written file to a poller
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+
+def _find_loop(words: list[str], max_n: int = 3, max_repeats: int = 4) -> tuple[int, int, int] | None:
+    """
+    Find a Whisper hallucination loop: some word n-gram (n <= max_n) repeated back-to-back
+    more than max_repeats times. Returns (start, n, copies) of the first such run, or None.
+    Only consecutive copies count, so phrases that merely recur in normal speech don't trip it.
+    """
+    lowered = [w.lower().strip(".,!?") for w in words]
+    for start in range(len(lowered)):
+        for n in range(1, max_n + 1):
+            gram = lowered[start:start + n]
+            if len(gram) < n:
+                break
+            copies = 1
+            while lowered[start + copies * n:start + (copies + 1) * n] == gram:
+                copies += 1
+            if copies > max_repeats:
+                return start, n, copies
+    return None
+
+
+def _is_repetitive(text: str, max_n: int = 3, max_repeats: int = 4) -> bool:
+    """
+    Detect Whisper hallucination loops in `text` (see _find_loop).
+    """
+    return _find_loop(text.split(), max_n, max_repeats) is not None
+
+
+def _collapse_loops(text: str, max_n: int = 3, max_repeats: int = 4) -> str:
+    """
+    Collapse every hallucinated loop in `text` to a single copy, keeping the surrounding words.
+    """
+    if not _is_repetitive(text, max_n, max_repeats):
+        return text
+    words = text.split()
+    while (loop := _find_loop(words, max_n, max_repeats)) is not None:
+        start, n, copies = loop
+        del words[start + n:start + copies * n]
+    return " " + " ".join(words)
+
+
+def _speech_sample(
+    audio: np.ndarray, chunks: list[tuple[float, float]], seconds: float = 30.0
+) -> np.ndarray:
+    """
+    Concatenate speech chunks from the start of the file until `seconds` of audio are collected.
+    """
+    parts, remaining = [], int(seconds * SAMPLE_RATE)
+    for chunk_start, chunk_end in chunks:
+        part = audio[int(chunk_start * SAMPLE_RATE):int(chunk_end * SAMPLE_RATE)][:remaining]
+        parts.append(part)
+        remaining -= len(part)
+        if remaining <= 0:
+            break
+    return np.concatenate(parts)
+
+
+def _transcribe_chunk(model, audio, language):
+    """
+    Decode one chunk on the given model; the segment generator is drained here so the
+    work happens on the calling thread (CTranslate2 releases the GIL while decoding).
+    Word timestamps let the overlap with the previous chunk be trimmed word by word.
+    """
+    segments, info = model.transcribe(
+        audio,
+        beam_size=1,
+        language=language,
+        condition_on_previous_text=False,
+        word_timestamps=True,
+    )
+    return list(segments), info
+
+
+def transcribe_file_sync(file_path: str, output_dir: Path, pcm_path: str | None = None):
+    """
+    Run whisper transcription (synchronous) and write outputs.
+    If pcm_path is given, the audio was already decoded during upload and is read from there.
+    """
+    # models are global
+    global MODELS
+    if not MODELS:
+        raise RuntimeError("Whisper model is not loaded.")
+
+    # decode once, then only run Whisper over speech regions (<=30s each, 1s overlap)
+    audio = load_pcm(pcm_path) if pcm_path else load_audio(file_path)
+    chunks = merge_chunks(speech_timestamps(audio))
+
+    srt_path = output_dir / "transcript.srt"
+    segments = []
+    segments_simple = []
+    last_end = 0.0
+    prev_key, repeat_run = None, 0
+
+    # detect the language once on up to 30s of speech and pin it for every chunk; per-chunk
+    # detection costs time and misfires on short chunks (e.g. a lone "Okay.")
+    language = None
+    if not MODELS[0].model.is_multilingual:
+        language = "en"  # *.en checkpoints only speak English
+    elif chunks:
+        language, _, _ = MODELS[0].detect_language(_speech_sample(audio, chunks))
+
+    # chunks are independent, so spread them round-robin over the per-GPU models
+    n = len(MODELS)
+    with ThreadPoolExecutor(max_workers=n) as ex, open(srt_path, "w", encoding="utf-8") as srt_file:
+        futures = [
+            ex.submit(
+                _transcribe_chunk,
+                MODELS[i % n],
+                audio[int(chunk_start * SAMPLE_RATE):int(chunk_end * SAMPLE_RATE)],
+                language,
+            )
+            for i, (chunk_start, chunk_end) in enumerate(chunks)
+        ]
+
+        try:
+            # futures are in chunk order, i.e. sorted by chunk start offset; cues are written
+            # as each chunk finishes while later chunks are still decoding
+            for (chunk_start, _), future in zip(chunks, futures):
+                chunk_segments, _ = future.result()
+                # drop only the words already emitted from the overlap with the previous chunk
+                for start, end, text, s in trim_overlap(chunk_segments, chunk_start, last_end):
+                    # a loop inside one segment is collapsed to a single copy; a loop spread over
+                    # segments shows up as the same text back-to-back, and only the extra copies go
+                    text = _collapse_loops(text)
+                    key = text.strip().lower()
+                    repeat_run = repeat_run + 1 if key == prev_key else 1
+                    prev_key = key
+                    if not key or repeat_run > MAX_SEGMENT_REPEATS:
+                        continue
+                    # downstream consumers only read id/start/end/text
+                    seg = {"id": len(segments), "start": start, "end": end, "text": text}
+                    if KEEP_RAW:
+                        seg.update({
+                            "seek": s.seek,
+                            "tokens": s.tokens,
+                            "temperature": s.temperature,
+                            "avg_logprob": s.avg_logprob,
+                            "compression_ratio": s.compression_ratio,
+                            "no_speech_prob": s.no_speech_prob,
+                        })
+                    segments.append(seg)
+                    seg_simple = {"start": float(start), "end": float(end), "text": text.strip()}
+                    segments_simple.append(seg_simple)
+                    srt_file.write(_srt_entry(len(segments_simple), seg_simple))
+                    if len(segments_simple) % SRT_FLUSH_EVERY == 0:
+                        srt_file.flush()
+                    last_end = end
+        except BaseException:
+            # one bad chunk fails the task; don't burn GPU time decoding the queued rest
+            # (chunks already running on a model still finish, CTranslate2 can't be interrupted)
+            ex.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    result = {
+        "language": language,
+        "segments": segments,
+    }
+
+    # prepare JSON out
+    json_path = output_dir / "transcript.json"
+    _write_json(json_path, result)
+
+    return {
+        "model": os.getenv("WHISPER_MODEL", "small"),
+        "language": language,
+        "segments": segments_simple,
+        "srt_path": str(srt_path),
+        "json_path": str(json_path),
+    }
+
+
+@celery.task(bind=True, acks_late=True, max_retries=2)
+def transcribe_task(self, file_path: str, output_dir: str, task_id: str, pcm_path: str | None = None):
+    """
+    Transcribe an uploaded file on a worker and store the final JSON summary.
+    """
+    task_output_dir = Path(output_dir)
+    retrying = False
+    try:
+        out = transcribe_file_sync(file_path, task_output_dir, pcm_path)
+        # augment with task id
+        out["task_id"] = task_id
+        # store final JSON summary
+        _write_json(task_output_dir / "summary.json", out)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            retrying = True
+            raise self.retry(exc=e)
+        # write error file for debugging
+        _write_json(task_output_dir / "error.json", {"error": str(e)})
+    finally:
+        # the decoded PCM is only scratch space for this task; keep it for retries only
+        if pcm_path and not retrying:
+            Path(pcm_path).unlink(missing_ok=True)
@@ -0,0 +1,28 @@
+from tasks import _collapse_loops, _is_repetitive
+
+
+def test_is_repetitive_flags_back_to_back_loop():
+    assert _is_repetitive(" Thank you. Thank you. Thank you. Thank you. Thank you. Thank you.")
+
+
+def test_is_repetitive_ignores_recurring_phrase_in_normal_speech():
+    text = (
+        " Thank you so much for coming. We really thank you so much, and thank you so much"
+        " to the team. Once again, thank you so much."
+    )
+    assert not _is_repetitive(text)
+
+
+def test_is_repetitive_ignores_counting_and_short_repeats():
+    assert not _is_repetitive(" one two three four five six seven eight nine ten")
+    assert not _is_repetitive(" no no no, I said no")
+
+
+def test_collapse_loops_keeps_surrounding_words():
+    text = " So I went to the the the the the the the store and bought milk"
+    assert _collapse_loops(text) == " So I went to the store and bought milk"
+
+
+def test_collapse_loops_leaves_clean_text_untouched():
+    text = " A perfectly normal sentence."
+    assert _collapse_loops(text) == text
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from modules.vad import merge_chunks, trim_overlap
+
+
+def _word(start, end, word):
+    return SimpleNamespace(start=start, end=end, word=word)
+
+
+def _segment(start, end, text, words=None):
+    return SimpleNamespace(start=start, end=end, text=text, words=words)
+
+
+def test_merge_chunks_merges_short_regions():
+    assert merge_chunks([(0, 5), (10, 20), (25, 40)]) == [(0, 20), (25, 40)]
+
+
+def test_merge_chunks_splits_long_region_with_overlap():
+    assert merge_chunks([(0, 65)]) == [(0, 30), (29, 59), (58, 65)]
+
+
+def test_merge_chunks_empty():
+    assert merge_chunks([]) == []
+
+
+def test_trim_overlap_keeps_new_words_of_straddling_segment():
+    # second window starts at 29s; previous window emitted speech up to 30s
+    seg = _segment(0.0, 8.0, " was said. And then more", words=[
+        _word(0.0, 0.5, " was"),
+        _word(0.5, 0.9, " said."),
+        _word(1.2, 1.6, " And"),
+        _word(1.6, 2.0, " then"),
+        _word(2.0, 8.0, " more"),
+    ])
+    kept = trim_overlap([seg], offset=29.0, last_end=30.0)
+    assert [(start, end, text) for start, end, text, _ in kept] == [(30.2, 37.0, " And then more")]
+
+
+def test_trim_overlap_clips_start_without_word_timestamps():
+    seg = _segment(0.0, 8.0, " new speech")
+    kept = trim_overlap([seg], offset=29.0, last_end=30.0)
+    assert [(start, end, text) for start, end, text, _ in kept] == [(30.0, 37.0, " new speech")]
+
+
+def test_trim_overlap_drops_fully_covered_segments():
+    covered = _segment(0.0, 0.8, " said.", words=[_word(0.0, 0.8, " said.")])
+    new = _segment(1.0, 5.0, " Next.", words=[_word(1.0, 5.0, " Next.")])
+    kept = trim_overlap([covered, new], offset=29.0, last_end=30.0)
+    assert [text for _, _, text, _ in kept] == [" Next."]
+
+
+def test_trim_overlap_first_chunk_is_untouched():
+    segs = [_segment(0.0, 2.0, " a"), _segment(2.0, 4.0, " b")]
+    kept = trim_overlap(segs, offset=0.0, last_end=0.0)
+    assert [(start, end, text) for start, end, text, _ in kept] == [(0.0, 2.0, " a"), (2.0, 4.0, " b")]